@@ -0,0 +1,133 @@
+# benchmarks/corpus.py
+
+import argparse
+import random
+
+import fitz  # PyMuPDF for PDF handling
+
+
+# Base-14 fonts that PyMuPDF can use without embedding anything
+FONTS = ["helv", "tiro", "cour", "hebo", "tibo", "heit"]
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore "
+    "et dolore magna aliqua enim ad minim veniam quis nostrud exercitation ullamco laboris nisi aliquip "
+    "ex ea commodo consequat duis aute irure in reprehenderit voluptate velit esse cillum fugiat nulla "
+    "pariatur excepteur sint occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim"
+).split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+GUTTER = 18
+
+
+def _sentence(rng, min_words=6, max_words=16):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def _page_blocks(rng, headings, paragraphs, list_items):
+    """Returns the (kind, text) blocks of one page, in reading order."""
+    blocks = []
+    sections = max(headings, 1)
+    for i in range(sections):
+        if i < headings:
+            # Markdown-style prefix, so StructureAnalyzer's heading rule has something to find
+            blocks.append(("heading", "# " + _sentence(rng, 2, 5).rstrip(".")))
+        for _ in range(paragraphs // sections + (i < paragraphs % sections)):
+            blocks.append(("paragraph", " ".join(_sentence(rng) for _ in range(rng.randint(2, 5)))))
+        if i == 0:
+            blocks.extend(("list", "- " + _sentence(rng, 3, 8)) for _ in range(list_items))
+    return blocks
+
+
+def _wrap(text, width, fontname, fontsize):
+    lines, line = [], ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and fitz.get_text_length(candidate, fontname=fontname, fontsize=fontsize) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _layout_page(page, blocks, columns, rng, fonts):
+    """Writes blocks into `columns` columns; text that does not fit on the page is dropped."""
+    column_width = (PAGE_WIDTH - 2 * MARGIN - (columns - 1) * GUTTER) / columns
+    column, y = 0, MARGIN
+    body_font = rng.choice(fonts)
+    for kind, text in blocks:
+        fontname, fontsize = (("hebo", 14) if kind == "heading" else (body_font, 10))
+        for line in _wrap(text, column_width, fontname, fontsize) + [""]:  # Blank line ends the block
+            if y + fontsize > PAGE_HEIGHT - MARGIN:
+                column, y = column + 1, MARGIN
+                if column == columns:
+                    return
+            x = MARGIN + column * (column_width + GUTTER)
+            if line:
+                page.insert_text((x, y + fontsize), line, fontname=fontname, fontsize=fontsize)
+            y += fontsize * 1.3
+
+
+def _scan(doc, page_index, dpi):
+    """Replaces a digital page by an image of itself, like a scanned page without a text layer."""
+    pix = doc[page_index].get_pixmap(dpi=dpi)
+    doc.delete_page(page_index)
+    page = doc.new_page(pno=page_index, width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    page.insert_image(page.rect, pixmap=pix)
+
+
+def generate_pdf(path, pages=10, columns=1, fonts=None, headings=2, paragraphs=4, list_items=4,
+                 scanned_ratio=0.0, dpi=150, seed=0):
+    """Writes a synthetic PDF to `path` and returns the indices (0-based) of the scanned pages.
+
+    The same arguments always produce the same document, so benchmark runs are comparable.
+    """
+    rng = random.Random(seed)
+    fonts = fonts or FONTS[:1]
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        _layout_page(page, _page_blocks(rng, headings, paragraphs, list_items), columns, rng, fonts)
+
+    scanned = [i for i in range(pages) if rng.random() < scanned_ratio]
+    for page_index in scanned:
+        _scan(doc, page_index, dpi)
+
+    doc.save(path)
+    doc.close()
+    return scanned
+
+
+def add_corpus_arguments(parser):
+    """Adds the generate_pdf options to an argparse parser (shared with run_benchmarks.py)."""
+    parser.add_argument("--pages", type=int, default=10, help="Number of pages.")
+    parser.add_argument("--columns", type=int, default=1, help="Text columns per page.")
+    parser.add_argument("--fonts", nargs="+", default=FONTS[:1], choices=FONTS, help="Body fonts to pick from.")
+    parser.add_argument("--headings", type=int, default=2, help="Headings per page.")
+    parser.add_argument("--paragraphs", type=int, default=4, help="Paragraphs per page.")
+    parser.add_argument("--list-items", type=int, default=4, help="List items per page.")
+    parser.add_argument("--scanned-ratio", type=float, default=0.0,
+                        help="Fraction of pages rendered as images without a text layer (0.0 - 1.0).")
+    parser.add_argument("--dpi", type=int, default=150, help="Resolution of scanned pages.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated content.")
+
+
+def corpus_config(args):
+    """The generate_pdf keyword arguments from parsed add_corpus_arguments options."""
+    return {"pages": args.pages, "columns": args.columns, "fonts": args.fonts, "headings": args.headings,
+            "paragraphs": args.paragraphs, "list_items": args.list_items, "scanned_ratio": args.scanned_ratio,
+            "dpi": args.dpi, "seed": args.seed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic PDF for benchmarking.")
+    parser.add_argument("output_pdf", help="Path of the PDF to write.")
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    scanned = generate_pdf(args.output_pdf, **corpus_config(args))
+    print(f"Wrote {args.pages} pages to {args.output_pdf} ({len(scanned)} scanned).")
@@ -0,0 +1,202 @@
+# benchmarks/run_benchmarks.py
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.corpus import add_corpus_arguments, corpus_config, generate_pdf
+from benchmarks.stub_backend import stub_persistence
+from instrumentation import metrics
+from latex_generator import LaTeXGenerator
+from pdf_parser import PDFParser
+from run_pipeline import convert
+from structure_analyzer import StructureAnalyzer
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+def parse_stage(pdf_path):
+    with tempfile.TemporaryDirectory() as output_dir:  # parse_pdf OCRs every PNG in output_dir
+        return PDFParser().parse_pdf(pdf_path, output_dir)
+
+
+def analyze_stage(extracted_text):
+    analyzer = StructureAnalyzer()
+    return {page_num: analyzer.analyze_text(text) for page_num, text in extracted_text.items()}
+
+
+def persistence_stage(structured_data):
+    persistence = stub_persistence()
+    persistence.store_document("benchmark.pdf", structured_data)
+    persistence.close()
+
+
+def latex_stage(structured_data):
+    return LaTeXGenerator(TEMPLATE_DIR).generate_latex(structured_data)
+
+
+def end_to_end(pdf_path):
+    """The real run_pipeline.convert code path, with the stub backend injected."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        args = argparse.Namespace(input_pdf=pdf_path, output_tex=os.path.join(work_dir, "output.tex"),
+                                  image_dir=os.path.join(work_dir, "images"), template_dir=TEMPLATE_DIR,
+                                  no_persist=False)
+        convert(args, persistence=stub_persistence())
+
+
+STAGES = {
+    "pdf_parser": parse_stage,
+    "structure_analyzer": analyze_stage,
+    "persistence": persistence_stage,
+    "latex_generator": latex_stage,
+    "end_to_end": end_to_end,
+}
+
+
+def check_tesseract():
+    """PDFParser turns OCR failures into empty pages, which would benchmark as impossibly fast parsing."""
+    import pytesseract
+    try:
+        pytesseract.get_tesseract_version()
+    except pytesseract.TesseractNotFoundError:
+        sys.exit("tesseract is not installed or not on PATH; the OCR stages cannot be benchmarked.")
+
+
+def _time(fn, arg, repeats):
+    """Runs fn(arg) `repeats` times after one untimed warm-up; returns the last result and the median wall time.
+
+    The warm-up keeps one-off costs (lazy imports of fitz, jinja2, py2neo, ...) out of the timings.
+    """
+    fn(arg)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(arg)
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def _run_stage(name, arg, repeats):
+    """Times one stage in the current (fresh) process; returns (result, seconds, peak_rss_kb, counters)."""
+    metrics.start()
+    result, seconds = _time(STAGES[name], arg, repeats)
+    return result, seconds, metrics.peak_rss_kb(), dict(metrics.counters)
+
+
+def _run_isolated(name, arg, repeats):
+    """Runs _run_stage in a new spawned process, so that ru_maxrss (which never goes down) is this stage's own."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(_run_stage, name, arg, repeats).result()
+
+
+def run_benchmarks(pdf_path, pages, repeats):
+    """Times each stage and the whole pipeline.  Returns {stage: {"seconds", "pages_per_sec", "peak_rss_kb"}}.
+
+    Stages run in pipeline order, each on the previous stage's output, and each in a process of
+    its own: "peak_rss_kb" is the peak of a fresh interpreter that ran only that stage (and its input).
+    """
+    results = {}
+
+    def run(name, arg):
+        result, seconds, peak_rss_kb, counters = _run_isolated(name, arg, repeats)
+        results[name] = {"seconds": seconds, "pages_per_sec": pages / seconds if seconds else None,
+                         "peak_rss_kb": peak_rss_kb}
+        return result, counters
+
+    extracted_text, counters = run("pdf_parser", pdf_path)
+    if counters.get("ocr.errors"):
+        sys.exit(f"{counters['ocr.errors']} page(s) failed OCR; refusing to report pdf_parser timings.")
+    structured_data, _ = run("structure_analyzer", extracted_text)
+    _, counters = run("persistence", structured_data)
+    results["persistence"]["round_trips_per_page"] = {  # _time's warm-up run is counted too
+        name: count / (pages * (repeats + 1)) for name, count in counters.items() if name.endswith("round_trips")
+    }
+    run("latex_generator", structured_data)
+    run("end_to_end", pdf_path)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns a list of regression messages: throughput down, or peak RSS up, by more than `threshold`."""
+    regressions = []
+    for name, base in baseline["stages"].items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["pages_per_sec"] is None or not base["pages_per_sec"]:
+            pass  # A zero-duration run has no meaningful throughput to compare
+        elif current["pages_per_sec"] < base["pages_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {current['pages_per_sec']:.2f} pages/s "
+                               f"(baseline {base['pages_per_sec']:.2f})")
+        if base.get("peak_rss_kb") and current["peak_rss_kb"] is not None \
+                and current["peak_rss_kb"] > base["peak_rss_kb"] * (1 + threshold):
+            regressions.append(f"{name}: peak RSS {current['peak_rss_kb']} KiB "
+                               f"(baseline {base['peak_rss_kb']} KiB)")
+    return regressions
+
+
+def report(results, baseline=None):
+    lines = [f"{'stage':<20}{'seconds':>10}{'pages/s':>12}{'baseline':>12}{'peak RSS MiB':>14}"]
+    for name, stats in results.items():
+        base = baseline["stages"].get(name, {}).get("pages_per_sec") if baseline else None
+        base = f"{base:.2f}" if base else "-"
+        rss = f"{stats['peak_rss_kb'] / 1024:.1f}" if stats["peak_rss_kb"] is not None else "-"
+        pages_per_sec = f"{stats['pages_per_sec']:.2f}" if stats["pages_per_sec"] is not None else "-"
+        lines.append(f"{name:<20}{stats['seconds']:>10.3f}{pages_per_sec:>12}{base:>12}{rss:>14}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF to LaTeX pipeline on a synthetic PDF.")
+    add_corpus_arguments(parser)
+    parser.add_argument("--pdf", help="Benchmark this PDF instead of generating one.")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per stage; the median is reported.")
+    parser.add_argument("--baseline", help="Compare against this results file and fail on regressions.")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Allowed relative slowdown (and peak RSS growth) before a stage counts as regressed.")
+    parser.add_argument("--output", help="Write the results as JSON (use it as a later --baseline).")
+    args = parser.parse_args()
+
+    check_tesseract()
+    config = corpus_config(args)
+    with tempfile.TemporaryDirectory() as work_dir:
+        pdf_path = args.pdf
+        if pdf_path is None:
+            pdf_path = os.path.join(work_dir, "corpus.pdf")
+            generate_pdf(pdf_path, **config)
+        else:
+            config = {"pdf": os.path.abspath(pdf_path)}
+        pages = PDFParser().page_count(pdf_path)
+        results = run_benchmarks(pdf_path, pages, args.repeats)
+
+    data = {"config": config, "repeats": args.repeats, "python": platform.python_version(),
+            "machine": platform.machine(), "stages": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(data, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Warning: the baseline was recorded with a different corpus configuration.")
+    print(report(results, baseline))
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
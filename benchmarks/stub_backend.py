@@ -0,0 +1,77 @@
+# benchmarks/stub_backend.py
+
+import itertools
+
+from persistence_layer import PersistenceLayer
+
+
+class StubCursor:
+    """Stands in for a psycopg2 cursor: every INSERT ... RETURNING gets a fresh id."""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self._row = None
+
+    def execute(self, query, params=None):
+        self._row = (next(self._ids),)
+
+    def fetchone(self):
+        return self._row
+
+    def close(self):
+        pass
+
+
+class StubConnection:
+    def cursor(self):
+        return StubCursor()
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _StubMatch:
+    def __init__(self, node):
+        self._node = node
+
+    def first(self):
+        return self._node
+
+
+class _StubNodeMatcher:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def match(self, label, **properties):
+        key, value = next(iter(properties.items()))
+        return _StubMatch(self._graph.index.get((label, key, value)))
+
+
+class StubGraph:
+    """Stands in for a py2neo Graph: keeps created nodes in a dict so nodes.match() finds them."""
+
+    def __init__(self):
+        self.index = {}
+        self.nodes = _StubNodeMatcher(self)
+
+    def create(self, subgraph):
+        for node in getattr(subgraph, "nodes", [subgraph]):
+            for label in node.labels:
+                for key in ("doc_id", "page_id", "block_id"):
+                    if key in node:
+                        self.index[(label, key, node[key])] = node
+
+
+def stub_persistence():
+    """A PersistenceLayer wired to in-memory stubs instead of live PostgreSQL/Neo4j connections.
+
+    Everything PersistenceLayer does on the Python side (query building, py2neo Node/Relationship
+    construction, round-trip accounting) still runs; only the network round trips are skipped.
+    """
+    return PersistenceLayer.from_connections(StubConnection(), StubGraph())
@@ -51,6 +51,31 @@ CREATE TABLE Equations (
 );
 
 
+-- Distributed work queue (see job_queue.py)
+-- Workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED and hold a lease
+-- that they extend with heartbeats.  Expired leases are reclaimed by other workers.
+
+CREATE TABLE Jobs (
+    job_id SERIAL PRIMARY KEY,
+    doc_id INTEGER REFERENCES Documents(doc_id),
+    job_type TEXT NOT NULL,  -- 'page', 'document', 'finalize'
+    page_number INTEGER,     -- only set for 'page' jobs
+    payload JSONB,           -- job parameters; unused by the built-in job types
+    status TEXT NOT NULL DEFAULT 'pending',  -- 'pending', 'leased', 'done', 'failed'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    leased_by TEXT,
+    lease_expires_at TIMESTAMPTZ,
+    result JSONB,            -- blocks for page/document jobs, {"latex": "..."} for finalize jobs
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX jobs_claimable_idx ON Jobs (status, lease_expires_at);
+CREATE INDEX jobs_doc_idx ON Jobs (doc_id, job_type);
+
+
 -- Neo4j Schema (pdf_to_latex_graph)
 
 -- Node labels: Document, Page, Block
@@ -0,0 +1,172 @@
+# instrumentation.py
+
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource  # Unix only; peak RSS is simply not reported elsewhere
+except ImportError:
+    resource = None
+
+
+class Metrics:
+    """Collects stage timings, counters and cache statistics for one pipeline run.
+
+    The pipeline modules report into the shared `metrics` instance below:
+
+        with metrics.stage("ocr", page=3):
+            ...
+        metrics.incr("postgres.round_trips")
+        metrics.cache_hit("source_pdf")
+
+    Stage totals, counters and cache statistics are always recorded; their size is bounded
+    by the number of distinct names.  Per-page stats and the event trace grow with the work
+    done, so they are only collected after start(), by callers that also export and reset
+    them (run_pipeline.py --metrics-out, run_worker.py --metrics-out).  The heap peak
+    (tracemalloc) has to be requested with start(trace_memory=True).
+
+    Workers may record from several threads (e.g. the job queue heartbeat), so updates
+    are serialized with a lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tracing = False
+        self._trace_memory = False
+        self._document = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}    # stage -> {"count", "total_s", "min_s", "max_s"}
+            self.pages = {}     # page number, or (doc_id, page number) inside document() -> {stage: seconds}
+            self.counters = {}  # name -> int
+            self.caches = {}    # name -> {"hits", "misses"}
+            self.events = []    # one entry per timed stage, in completion order
+            self._started_at = time.perf_counter()
+
+    def start(self, trace_memory=False):
+        """Resets all metrics, starts the wall clock and turns on per-page stats and events."""
+        self.reset()
+        self._tracing = True
+        if trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+        self._trace_memory = trace_memory
+
+    @contextmanager
+    def document(self, doc_id):
+        """Attributes page stats recorded in the enclosed block to (doc_id, page).
+
+        Needed wherever one process handles pages of many documents, like a job queue worker.
+        """
+        self._document = doc_id
+        try:
+            yield
+        finally:
+            self._document = None
+
+    @contextmanager
+    def stage(self, name, page=None):
+        """Times the enclosed block as `name` (and attributes it to `page`, if given)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, page=page, start=start)
+
+    def record(self, name, seconds, page=None, start=None):
+        """Records an externally measured duration for a stage."""
+        if page is not None and self._document is not None:
+            page = (self._document, page)
+        with self._lock:
+            stats = self.stages.setdefault(name, {"count": 0, "total_s": 0.0, "min_s": None, "max_s": 0.0})
+            stats["count"] += 1
+            stats["total_s"] += seconds
+            stats["min_s"] = seconds if stats["min_s"] is None else min(stats["min_s"], seconds)
+            stats["max_s"] = max(stats["max_s"], seconds)
+            if not self._tracing:
+                return
+            if page is not None:
+                page_stats = self.pages.setdefault(page, {})
+                page_stats[name] = page_stats.get(name, 0.0) + seconds
+            offset = None if start is None else start - self._started_at
+            self.events.append({"stage": name, "page": _page_key(page), "start_s": offset, "duration_s": seconds})
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def cache_hit(self, name):
+        with self._lock:
+            self.caches.setdefault(name, {"hits": 0, "misses": 0})["hits"] += 1
+
+    def cache_miss(self, name):
+        with self._lock:
+            self.caches.setdefault(name, {"hits": 0, "misses": 0})["misses"] += 1
+
+    def peak_rss_kb(self):
+        """Peak resident set size of this process in KiB (Linux reports ru_maxrss in KiB)."""
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def snapshot(self):
+        """Returns all metrics as a JSON-serializable dict."""
+        with self._lock:
+            caches = {}
+            for name, stats in self.caches.items():
+                lookups = stats["hits"] + stats["misses"]
+                caches[name] = dict(stats, hit_rate=stats["hits"] / lookups if lookups else None)
+
+            data = {
+                "wall_time_s": time.perf_counter() - self._started_at,
+                "peak_rss_kb": self.peak_rss_kb(),
+                "stages": {name: dict(stats) for name, stats in self.stages.items()},
+                "pages": {_page_key(page): dict(stats) for page, stats in sorted(self.pages.items())},
+                "counters": dict(self.counters),
+                "caches": caches,
+                "events": list(self.events),
+            }
+        if self._trace_memory:
+            data["tracemalloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        return data
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def append_json_line(self, path):
+        """Appends the current snapshot as one line of JSON, for long-running processes that flush periodically."""
+        with open(path, "a") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def summary(self):
+        """A short human-readable table of stage totals, slowest first."""
+        lines = [f"{'stage':<24}{'count':>8}{'total s':>12}{'max s':>12}"]
+        snapshot = self.snapshot()
+        for name, stats in sorted(snapshot["stages"].items(), key=lambda item: -item[1]["total_s"]):
+            lines.append(f"{name:<24}{stats['count']:>8}{stats['total_s']:>12.3f}{stats['max_s']:>12.3f}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"{name}: {value}")
+        for name, stats in sorted(snapshot["caches"].items()):
+            lines.append(f"cache {name}: {stats['hits']} hits, {stats['misses']} misses")
+        peak_rss_kb = self.peak_rss_kb()
+        if peak_rss_kb is not None:
+            lines.append(f"peak RSS: {peak_rss_kb / 1024:.1f} MiB")
+        return "\n".join(lines)
+
+
+def _page_key(page):
+    """JSON key for a page: "3", or "12:3" for page 3 of document 12."""
+    if isinstance(page, tuple):
+        return ":".join(str(part) for part in page)
+    return None if page is None else str(page)
+
+
+metrics = Metrics()  # Shared by all pipeline modules
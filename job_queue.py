@@ -0,0 +1,397 @@
+# job_queue.py
+
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import psycopg2  # PostgreSQL library
+from psycopg2.extras import Json
+
+from pdf_parser import PDFParser
+from structure_analyzer import StructureAnalyzer
+from latex_generator import LaTeXGenerator
+from instrumentation import metrics
+
+
+class JobQueue:
+    """PostgreSQL-backed work queue (see the Jobs table in database_schemas/postgresql_schema.sql).
+
+    Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers on any
+    number of nodes can poll the same table without handing out a job twice.  A claimed job
+    carries a lease; the worker extends it with heartbeat() while it runs.  If a worker dies the
+    lease expires and the job becomes claimable again, until max_attempts is used up.
+    """
+
+    def __init__(self, pg_conn_str):
+        self.pg_conn = psycopg2.connect(pg_conn_str)
+        self.pg_cursor = self.pg_conn.cursor()
+        self._lock = threading.Lock()  # The heartbeat thread shares this connection
+
+    def _pg_execute(self, query, params=None, fetch=None):
+        """Runs a query in its own transaction.  fetch is None, "one" or "all"."""
+        metrics.incr("postgres.round_trips")
+        with self._lock:
+            try:
+                self.pg_cursor.execute(query, params)
+                rows = None
+                if fetch == "one":
+                    rows = self.pg_cursor.fetchone()
+                elif fetch == "all":
+                    rows = self.pg_cursor.fetchall()
+                self.pg_conn.commit()
+                return rows
+            except psycopg2.Error as e:
+                self.pg_conn.rollback()
+                raise e
+
+    def enqueue_document(self, filename, source_pdf, page_count, granularity="page", max_attempts=3):
+        """Stores the PDF in Documents and queues its work plus one finalize job.
+
+        granularity="page" queues one job per page; "document" queues a single job for the whole PDF.
+        Everything is inserted in one transaction so workers never see a half-queued document.
+        """
+        if granularity not in ("page", "document"):
+            raise ValueError(f"Unknown granularity: {granularity}")
+
+        with self._lock:
+            try:
+                self.pg_cursor.execute(
+                    "INSERT INTO Documents (filename, source_pdf) VALUES (%s, %s) RETURNING doc_id;",
+                    (filename, psycopg2.Binary(source_pdf)),
+                )
+                doc_id = self.pg_cursor.fetchone()[0]
+
+                insert_job = (
+                    "INSERT INTO Jobs (doc_id, job_type, page_number, payload, max_attempts) "
+                    "VALUES (%s, %s, %s, %s, %s);"
+                )
+                if granularity == "page":
+                    for page_number in range(1, page_count + 1):
+                        self.pg_cursor.execute(insert_job, (doc_id, "page", page_number, None, max_attempts))
+                else:
+                    self.pg_cursor.execute(insert_job, (doc_id, "document", None, None, max_attempts))
+                self.pg_cursor.execute(insert_job, (doc_id, "finalize", None, None, max_attempts))
+                self.pg_conn.commit()
+                metrics.incr("postgres.round_trips", (page_count if granularity == "page" else 1) + 2)
+            except psycopg2.Error as e:
+                self.pg_conn.rollback()
+                raise e
+        return doc_id
+
+    def claim(self, worker_id, lease_seconds):
+        """Leases the next runnable job to worker_id.  Returns a job dict, or None if nothing is runnable.
+
+        A job is runnable if it is pending, or leased with an expired lease (its worker died).
+        Finalize jobs only become runnable once every other job of the document is done.
+        """
+        query = """
+            WITH next_job AS (
+                SELECT j.job_id FROM Jobs j
+                WHERE (j.status = 'pending' OR (j.status = 'leased' AND j.lease_expires_at < now()))
+                  AND j.attempts < j.max_attempts
+                  AND (j.job_type <> 'finalize' OR NOT EXISTS (
+                        SELECT 1 FROM Jobs dep
+                        WHERE dep.doc_id = j.doc_id AND dep.job_type <> 'finalize' AND dep.status <> 'done'))
+                ORDER BY j.job_id
+                LIMIT 1
+                FOR UPDATE OF j SKIP LOCKED
+            )
+            UPDATE Jobs SET status = 'leased',
+                            leased_by = %s,
+                            lease_expires_at = now() + %s * interval '1 second',
+                            attempts = Jobs.attempts + 1,
+                            updated_at = now()
+            FROM next_job
+            WHERE Jobs.job_id = next_job.job_id
+            RETURNING Jobs.job_id, Jobs.doc_id, Jobs.job_type, Jobs.page_number, Jobs.payload, Jobs.attempts;
+        """
+        row = self._pg_execute(query, (worker_id, lease_seconds), fetch="one")
+        if row is None:
+            return None
+        job_id, doc_id, job_type, page_number, payload, attempts = row
+        return {"job_id": job_id, "doc_id": doc_id, "job_type": job_type,
+                "page_number": page_number, "payload": payload or {}, "attempts": attempts}
+
+    def heartbeat(self, job_id, worker_id, lease_seconds):
+        """Extends a lease.  Returns False if the lease was lost (expired and reclaimed by another worker)."""
+        query = """
+            UPDATE Jobs SET lease_expires_at = now() + %s * interval '1 second', updated_at = now()
+            WHERE job_id = %s AND leased_by = %s AND status = 'leased'
+            RETURNING job_id;
+        """
+        return self._pg_execute(query, (lease_seconds, job_id, worker_id), fetch="one") is not None
+
+    def complete(self, job_id, worker_id, result):
+        """Records a job's result.  Returns False (and records nothing) if worker_id no longer holds the lease."""
+        query = """
+            UPDATE Jobs SET status = 'done', result = %s, error = NULL, lease_expires_at = NULL, updated_at = now()
+            WHERE job_id = %s AND leased_by = %s AND status = 'leased'
+            RETURNING job_id;
+        """
+        return self._pg_execute(query, (Json(result), job_id, worker_id), fetch="one") is not None
+
+    def fail(self, job_id, worker_id, error):
+        """Releases a job after an error.  It is retried unless max_attempts is used up.
+
+        A job that fails for good takes its document's finalize job with it, in the same statement:
+        a finalize job left pending behind a failed dependency would never run.
+        """
+        query = """
+            WITH failed_job AS (
+                UPDATE Jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                                error = %s, lease_expires_at = NULL, updated_at = now()
+                WHERE job_id = %s AND leased_by = %s AND status = 'leased'
+                RETURNING doc_id, status
+            ), failed_finalize AS (
+                UPDATE Jobs SET status = 'failed', error = 'a dependent job failed', updated_at = now()
+                FROM failed_job
+                WHERE Jobs.doc_id = failed_job.doc_id AND failed_job.status = 'failed'
+                  AND Jobs.job_type = 'finalize' AND Jobs.status = 'pending'
+            )
+            SELECT doc_id, status FROM failed_job;
+        """
+        self._pg_execute(query, (str(error), job_id, worker_id), fetch="one")
+
+    def reap_expired(self):
+        """Marks jobs as failed whose lease expired after their last allowed attempt.
+
+        Expired jobs with attempts left need no reaping: claim() picks them up directly.
+        The same statement fails every pending finalize job whose document has a failed job,
+        including any left behind by a connection lost mid-failure.  Returns the number of jobs failed.
+        """
+        query = """
+            WITH expired AS (
+                UPDATE Jobs SET status = 'failed', error = 'lease expired', lease_expires_at = NULL, updated_at = now()
+                WHERE status = 'leased' AND lease_expires_at < now() AND attempts >= max_attempts
+                RETURNING doc_id
+            ), failed_finalize AS (
+                UPDATE Jobs f SET status = 'failed', error = 'a dependent job failed', updated_at = now()
+                WHERE f.job_type = 'finalize' AND f.status = 'pending'
+                  AND (f.doc_id IN (SELECT doc_id FROM expired) OR EXISTS (
+                        SELECT 1 FROM Jobs dep
+                        WHERE dep.doc_id = f.doc_id AND dep.job_type <> 'finalize' AND dep.status = 'failed'))
+            )
+            SELECT count(*) FROM expired;
+        """
+        return self._pg_execute(query, fetch="one")[0]
+
+    def get_source_pdf(self, doc_id):
+        row = self._pg_execute("SELECT source_pdf FROM Documents WHERE doc_id = %s;", (doc_id,), fetch="one")
+        return bytes(row[0])
+
+    def get_document_results(self, doc_id):
+        """Collects the analyzed blocks of a document as {page_number: [blocks]}, in page order."""
+        query = """
+            SELECT job_type, page_number, result FROM Jobs
+            WHERE doc_id = %s AND job_type IN ('page', 'document') AND status = 'done';
+        """
+        structured_data = {}
+        for job_type, page_number, result in self._pg_execute(query, (doc_id,), fetch="all"):
+            if job_type == "page":
+                structured_data[page_number] = result
+            else:
+                # JSON object keys are strings; turn them back into page numbers
+                structured_data.update((int(page), blocks) for page, blocks in result.items())
+        return dict(sorted(structured_data.items()))
+
+    def get_finalize_result(self, doc_id):
+        """Returns (status, result) of a document's finalize job; result holds the LaTeX once status is 'done'."""
+        return self._pg_execute(
+            "SELECT status, result FROM Jobs WHERE doc_id = %s AND job_type = 'finalize';", (doc_id,), fetch="one"
+        )
+
+    def document_status(self, doc_id):
+        """Returns {status: count} over all jobs of a document."""
+        rows = self._pg_execute(
+            "SELECT status, count(*) FROM Jobs WHERE doc_id = %s GROUP BY status;", (doc_id,), fetch="all"
+        )
+        return dict(rows)
+
+    def close(self):
+        self.pg_cursor.close()
+        self.pg_conn.close()
+
+
+class LeaseLost(Exception):
+    """Raised inside a job once its heartbeat finds that the lease was reclaimed by another worker."""
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps a job's lease alive while the worker is busy with it."""
+
+    def __init__(self, queue, job_id, worker_id, lease_seconds):
+        super().__init__(daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.job_id, self.worker_id, self.lease_seconds):
+                    self.lost = True
+                    return
+            except psycopg2.Error as e:
+                print(f"Heartbeat for job {self.job_id} failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Worker:
+    """Claims jobs from a JobQueue and runs them until the queue is drained (or forever)."""
+
+    queue_class = JobQueue
+    max_reconnect_delay = 60.0
+
+    def __init__(self, pg_conn_str, worker_id=None, lease_seconds=60, poll_interval=2.0,
+                 tesseract_path=None, template_dir="templates", metrics_out=None, metrics_interval=60.0):
+        self.pg_conn_str = pg_conn_str
+        self.queue = self.queue_class(pg_conn_str)
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.pdf_parser = PDFParser(tesseract_path)
+        self.analyzer = StructureAnalyzer()
+        self.template_dir = template_dir
+        self._heartbeat = None  # Of the job being run
+        self._source_pdfs = {}  # doc_id -> PDF bytes, so consecutive page jobs don't refetch them
+        self.metrics_out = metrics_out  # JSON Lines file; one snapshot is appended per flush
+        self.metrics_interval = metrics_interval
+        self._metrics_flushed_at = time.monotonic()
+
+    def run(self, max_jobs=None, exit_when_idle=False):
+        """Main loop.  Returns the number of jobs processed."""
+        if self.metrics_out:
+            metrics.start()
+        try:
+            return self._run(max_jobs, exit_when_idle)
+        finally:
+            self._flush_metrics()
+
+    def _run(self, max_jobs, exit_when_idle):
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            if self.metrics_out and time.monotonic() - self._metrics_flushed_at >= self.metrics_interval:
+                self._flush_metrics()
+            try:
+                self.queue.reap_expired()
+                job = self.queue.claim(self.worker_id, self.lease_seconds)
+                if job is None:
+                    if exit_when_idle:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                processed += 1
+                self.run_job(job)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                # Any lease we held expires on its own and is reclaimed by another worker
+                print(f"[{self.worker_id}] Lost the database connection: {e}")
+                self._reconnect()
+        return processed
+
+    def _flush_metrics(self):
+        """Appends the metrics collected since the last flush to metrics_out and starts a new interval.
+
+        Resetting keeps a long-running worker's per-page stats and event trace bounded.
+        """
+        if not self.metrics_out:
+            return
+        metrics.append_json_line(self.metrics_out)
+        metrics.start()
+        self._metrics_flushed_at = time.monotonic()
+
+    def _reconnect(self):
+        """Replaces self.queue with a fresh connection, retrying with exponential backoff."""
+        try:
+            self.queue.close()
+        except psycopg2.Error:
+            pass  # The old connection is already gone
+        delay = self.poll_interval
+        while True:
+            time.sleep(delay)
+            try:
+                self.queue = self.queue_class(self.pg_conn_str)
+                print(f"[{self.worker_id}] Reconnected to the database.")
+                return
+            except psycopg2.OperationalError as e:
+                print(f"[{self.worker_id}] Reconnect failed, retrying in {delay:.0f}s: {e}")
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    def run_job(self, job):
+        heartbeat = self._heartbeat = _Heartbeat(self.queue, job["job_id"], self.worker_id, self.lease_seconds)
+        heartbeat.start()
+        try:
+            handler = getattr(self, f"_run_{job['job_type']}_job")
+            with metrics.document(job["doc_id"]), metrics.stage(f"job.{job['job_type']}", page=job["page_number"]):
+                result = handler(job)
+            self._check_lease()
+        except LeaseLost:  # Another worker owns the job now; leave it alone
+            heartbeat.stop()
+            print(f"[{self.worker_id}] Lost the lease on job {job['job_id']}; abandoned it.")
+            metrics.incr("jobs.lease_lost")
+            return
+        except Exception as e:  # Any failure releases the job for a retry
+            heartbeat.stop()
+            print(f"[{self.worker_id}] Job {job['job_id']} ({job['job_type']}) failed: {e}")
+            metrics.incr("jobs.failed")
+            self.queue.fail(job["job_id"], self.worker_id, e)
+            return
+        heartbeat.stop()
+        if not self.queue.complete(job["job_id"], self.worker_id, result):
+            print(f"[{self.worker_id}] Lost the lease on job {job['job_id']}; result discarded.")
+            metrics.incr("jobs.lease_lost")
+
+    def _check_lease(self):
+        """Stops the current job early if its lease was lost; its result would be discarded anyway."""
+        if self._heartbeat is not None and self._heartbeat.lost:
+            raise LeaseLost()
+
+    def _source_pdf(self, doc_id):
+        if doc_id in self._source_pdfs:
+            metrics.cache_hit("source_pdf")
+        else:
+            metrics.cache_miss("source_pdf")
+            self._source_pdfs.clear()  # Only keep the current document in memory
+            self._source_pdfs[doc_id] = self.queue.get_source_pdf(doc_id)
+        return self._source_pdfs[doc_id]
+
+    def _run_page_job(self, job):
+        with tempfile.TemporaryDirectory() as output_dir:  # Workers on one node must not share images
+            text = self.pdf_parser.parse_page(self._source_pdf(job["doc_id"]), job["page_number"], output_dir)
+        self._check_lease()
+        return self.analyzer.analyze_text(text)
+
+    def _run_document_job(self, job):
+        with tempfile.TemporaryDirectory() as output_dir:
+            extracted_text = self.pdf_parser.parse_pdf(self._source_pdf(job["doc_id"]), output_dir)
+        self._check_lease()
+        return {page_num: self.analyzer.analyze_text(text) for page_num, text in extracted_text.items()}
+
+    def _run_finalize_job(self, job):
+        document_data_for_latex = self.queue.get_document_results(job["doc_id"])
+        latex_code = LaTeXGenerator(self.template_dir).generate_latex(document_data_for_latex)
+
+        self._source_pdfs.pop(job["doc_id"], None)
+        return {"latex": latex_code}
+
+    def close(self):
+        self.queue.close()
+
+
+# Example usage: queue a document, then start workers with run_worker.py on any node.
+if __name__ == "__main__":
+    queue = JobQueue(os.environ.get("PG_CONN_STR"))
+    pdf_file = "path/to/your/pdf_file.pdf"  # Replace with your PDF file
+    with open(pdf_file, "rb") as f:
+        source_pdf = f.read()
+    doc_id = queue.enqueue_document(os.path.basename(pdf_file), source_pdf,
+                                    PDFParser().page_count(source_pdf))
+    print(f"Queued document {doc_id}: {queue.document_status(doc_id)}")
+    queue.close()
@@ -1,9 +1,8 @@
 # latex_generator.py
 
-from jinja2 import Environment, FileSystemLoader
-
 class LaTeXGenerator:
     def __init__(self, template_dir="templates"):
+        from jinja2 import Environment, FileSystemLoader  # Imported here to keep module import cheap
         self.env = Environment(loader=FileSystemLoader(template_dir))
 
     def generate_latex(self, document_data):
@@ -1,37 +1,64 @@
 # pdf_parser.py
 
 import os
-import subprocess
-import pytesseract  # Example OCR; consider others like TesseractOCR
-from PIL import Image
-import fitz  # PyMuPDF for PDF handling
+
+from instrumentation import metrics
+
+# pytesseract, PIL and fitz (PyMuPDF) are imported inside the methods that use them,
+# so importing this module stays cheap for callers that never rasterize or OCR.
 
 
 class PDFParser:
     def __init__(self, tesseract_path=None):  # Add tesseract path
         """Initializes the PDFParser.  Set the path to your Tesseract executable if needed."""
         if tesseract_path:
+            import pytesseract  # Example OCR; consider others like TesseractOCR
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
 
-    def _rasterize_pdf(self, pdf_path, output_dir):
-        """Rasterizes a PDF into images (PNG format)."""
-        doc = fitz.open(pdf_path)
-        for page_num in range(doc.page_count):
+    def _open_pdf(self, pdf_source):
+        """Opens a PDF from a file path or from raw bytes (e.g. Documents.source_pdf)."""
+        import fitz  # PyMuPDF for PDF handling
+        if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+            return fitz.open(stream=bytes(pdf_source), filetype="pdf")
+        return fitz.open(pdf_source)
+
+    def _rasterize_page(self, doc, page_num, output_dir):
+        """Rasterizes a single (0-based) page of an open PDF and returns the image path."""
+        from PIL import Image
+        with metrics.stage("rasterize", page=page_num + 1):
             page = doc[page_num]
             pix = page.get_pixmap()
             img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            img.save(os.path.join(output_dir, f"page_{page_num + 1:04d}.png"))
+            image_path = os.path.join(output_dir, f"page_{page_num + 1:04d}.png")
+            img.save(image_path)
+        return image_path
+
+    def _rasterize_pdf(self, pdf_path, output_dir):
+        """Rasterizes a PDF into images (PNG format)."""
+        doc = self._open_pdf(pdf_path)
+        for page_num in range(doc.page_count):
+            self._rasterize_page(doc, page_num, output_dir)
         doc.close()
 
+    def page_count(self, pdf_source):
+        """Returns the number of pages in a PDF (path or bytes)."""
+        doc = self._open_pdf(pdf_source)
+        count = doc.page_count
+        doc.close()
+        return count
+
 
     def extract_text_from_image(self, image_path):  # Updated
         """Extracts text from a single image using OCR."""
+        import pytesseract  # Outside the try: a missing dependency is not an OCR error
+        from PIL import Image
         try:
             img = Image.open(image_path)
             text = pytesseract.image_to_string(img)
             return text
         except Exception as e:  # Handle OCR errors
             print(f"Error during OCR: {e}")
+            metrics.incr("ocr.errors")
             return ""  # Or raise the exception if you want to stop processing
 
 
@@ -48,11 +75,28 @@ class PDFParser:
             if filename.endswith(".png"):
                 image_path = os.path.join(output_dir, filename)
                 page_num = int(filename[5:9])  # Extract page number (assuming naming convention) # Updated
-                text = self.extract_text_from_image(image_path)
+                with metrics.stage("ocr", page=page_num):
+                    text = self.extract_text_from_image(image_path)
                 extracted_text[page_num] = text
 
         return extracted_text
 
+    def parse_page(self, pdf_source, page_number, output_dir="exported_images"):
+        """Rasterizes and OCRs a single page (1-based, like the keys of parse_pdf's result).
+
+        Used by job queue workers, which only own one page of a document at a time.
+        """
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        doc = self._open_pdf(pdf_source)
+        try:
+            image_path = self._rasterize_page(doc, page_number - 1, output_dir)
+        finally:
+            doc.close()
+        with metrics.stage("ocr", page=page_number):
+            return self.extract_text_from_image(image_path)
+
 
 # Example usage (in your main pipeline script - run_pipeline.py)
 if __name__ == "__main__":
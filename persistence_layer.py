@@ -1,31 +1,34 @@
 # persistence_layer.py (Neo4j Interactions)
 
-from py2neo import Graph, Node, Relationship
+# psycopg2 and py2neo are imported when a class is instantiated, so that importing this
+# module neither loads the database drivers nor connects to anything.
 
 class Neo4jPersistence:
     def __init__(self, uri, username, password):
-        self.graph = Graph(uri, auth=(username, password))
+        import py2neo
+        self._py2neo = py2neo
+        self.graph = py2neo.Graph(uri, auth=(username, password))
 
     def create_document_node(self, doc_id, filename):
         """Creates a Document node in Neo4j."""
-        node = Node("Document", doc_id=doc_id, filename=filename)
+        node = self._py2neo.Node("Document", doc_id=doc_id, filename=filename)
         self.graph.create(node)
         return node
 
     def create_page_node(self, page_id, doc_id, page_number, width, height):
         """Creates a Page node and links it to a Document."""
-        page_node = Node("Page", page_id=page_id, doc_id=doc_id, page_number=page_number, width=width, height=height)
+        page_node = self._py2neo.Node("Page", page_id=page_id, doc_id=doc_id, page_number=page_number, width=width, height=height)
         doc_node = self.graph.nodes.match("Document", doc_id=doc_id).first()
         if doc_node:
-            self.graph.create(Relationship(doc_node, "CONTAINS", page_node))
+            self.graph.create(self._py2neo.Relationship(doc_node, "CONTAINS", page_node))
         return page_node
 
     def create_block_node(self, block_id, page_id, block_type, x, y, width, height, **kwargs):  # Updated
         """Creates a Block node and links it to a Page."""
-        block_node = Node("Block", block_id=block_id, page_id=page_id, block_type=block_type, x=x, y=y, width=width, height=height, **kwargs)  # Include additional properties
+        block_node = self._py2neo.Node("Block", block_id=block_id, page_id=page_id, block_type=block_type, x=x, y=y, width=width, height=height, **kwargs)  # Include additional properties
         page_node = self.graph.nodes.match("Page", page_id=page_id).first()
         if page_node:
-            self.graph.create(Relationship(page_node, "CONTAINS", block_node))
+            self.graph.create(self._py2neo.Relationship(page_node, "CONTAINS", block_node))
         return block_node
 
     def create_follows_relationship(self, block_id1, block_id2):
@@ -33,7 +36,7 @@ class Neo4jPersistence:
         block1 = self.graph.nodes.match("Block", block_id=block_id1).first()
         block2 = self.graph.nodes.match("Block", block_id=block_id2).first()
         if block1 and block2:
-            self.graph.create(Relationship(block1, "FOLLOWS", block2))
+            self.graph.create(self._py2neo.Relationship(block1, "FOLLOWS", block2))
 
 
     # ... (Add other methods for creating relationships, querying, etc.)
@@ -42,50 +45,41 @@ class Neo4jPersistence:
         self.graph.delete_all()
 
 
-# Example usage (in your main pipeline script)
-
-# ... (Get database credentials from configuration)
-neo4j_persistence = Neo4jPersistence(uri, username, password) # Replace with actual DB config
-
-# clear the DB.
-neo4j_persistence.clear_database() # Replace with actual DB config
-
-# Example: Create a document and a page
-doc_node = neo4j_persistence.create_document_node(1, "my_document.pdf")
-page_node = neo4j_persistence.create_page_node(1, 1, 1, 8.5, 11)
-
-# Example: Create some blocks and a FOLLOWS relationship. text_content is passed as **kwargs in this example
-block1 = neo4j_persistence.create_block_node(1, 1, "text", 10, 10, 200, 50, text_content="This is the first block.") # Example usage of **kwargs
-block2 = neo4j_persistence.create_block_node(2, 1, "image", 10, 70, 300, 200)
-
-neo4j_persistence.create_follows_relationship(1, 2)
-
-
-# ... (Rest of your pipeline logic)
-
-
-
-
-
-
 
 # persistence_layer.py
 
-import psycopg2  # PostgreSQL library
-from py2neo import Graph, Node, Relationship
+from instrumentation import metrics
 
 
 class PersistenceLayer:
     def __init__(self, pg_conn_str, neo4j_uri, neo4j_username, neo4j_password):
-        self.pg_conn = psycopg2.connect(pg_conn_str)
+        self._load_drivers()
+        self.pg_conn = self._psycopg2.connect(pg_conn_str)
         self.pg_cursor = self.pg_conn.cursor()
-        self.neo4j_graph = Graph(neo4j_uri, auth=(neo4j_username, neo4j_password))
+        self.neo4j_graph = self._py2neo.Graph(neo4j_uri, auth=(neo4j_username, neo4j_password))
+
+    @classmethod
+    def from_connections(cls, pg_conn, neo4j_graph):
+        """Wraps already open connections (or stand-ins for them, as in the benchmarks) instead of connecting."""
+        persistence = cls.__new__(cls)
+        persistence._load_drivers()
+        persistence.pg_conn = pg_conn
+        persistence.pg_cursor = pg_conn.cursor()
+        persistence.neo4j_graph = neo4j_graph
+        return persistence
+
+    def _load_drivers(self):
+        import psycopg2  # PostgreSQL library
+        import py2neo
+        self._psycopg2 = psycopg2
+        self._py2neo = py2neo
 
     def _pg_execute(self, query, params=None): # Helper to avoid repetition
+        metrics.incr("postgres.round_trips")
         try:
             self.pg_cursor.execute(query, params)
             self.pg_conn.commit()
-        except psycopg2.Error as e:
+        except self._psycopg2.Error as e:
             self.pg_conn.rollback() # Handle errors properly. Important!
             raise e # Reraise for now so you see it. Better to log it.
 
@@ -95,8 +89,9 @@ class PersistenceLayer:
         self._pg_execute(query, (filename, source_pdf))  # Use parameterized query
         doc_id = self.pg_cursor.fetchone()[0]
 
-        neo4j_node = Node("Document", doc_id=doc_id, filename=filename)
+        neo4j_node = self._py2neo.Node("Document", doc_id=doc_id, filename=filename)
         self.neo4j_graph.create(neo4j_node)
+        metrics.incr("neo4j.round_trips")
         return doc_id
 
 
@@ -107,9 +102,10 @@ class PersistenceLayer:
         self._pg_execute(query, (doc_id, page_number, width, height))
         page_id = self.pg_cursor.fetchone()[0]
 
-        neo4j_node = Node("Page", page_id=page_id, doc_id=doc_id, page_number=page_number, width=width, height=height)
+        neo4j_node = self._py2neo.Node("Page", page_id=page_id, doc_id=doc_id, page_number=page_number, width=width, height=height)
         doc_node = self.neo4j_graph.nodes.match("Document", doc_id=doc_id).first()
-        self.neo4j_graph.create(Relationship(doc_node, "CONTAINS", neo4j_node)) # Assuming doc_node exists
+        self.neo4j_graph.create(self._py2neo.Relationship(doc_node, "CONTAINS", neo4j_node)) # Assuming doc_node exists
+        metrics.incr("neo4j.round_trips", 2)  # match + create
         return page_id
 
     def create_block(self, page_id, block_type, x, y, width, height, **kwargs):  # Flexible kwargs
@@ -121,9 +117,10 @@ class PersistenceLayer:
         # Dynamically add properties to Neo4j node based on kwargs
         neo4j_props = {"block_id": block_id, "page_id": page_id, "block_type": block_type, "x": x, "y": y, "width": width, "height": height}
         neo4j_props.update(kwargs) # Handles additional block specific attributes. very important
-        neo4j_node = Node("Block", **neo4j_props)
+        neo4j_node = self._py2neo.Node("Block", **neo4j_props)
         page_node = self.neo4j_graph.nodes.match("Page", page_id=page_id).first()
-        self.neo4j_graph.create(Relationship(page_node, "CONTAINS", neo4j_node))  # Assuming page_node exists
+        self.neo4j_graph.create(self._py2neo.Relationship(page_node, "CONTAINS", neo4j_node))  # Assuming page_node exists
+        metrics.incr("neo4j.round_trips", 2)  # match + create
 
         # Handle specific block types in PostgreSQL (using separate tables for now)
         if block_type == "text":
@@ -139,10 +136,50 @@ class PersistenceLayer:
         """Creates a FOLLOWS relationship between two blocks in Neo4j."""
         block1 = self.neo4j_graph.nodes.match("Block", block_id=block_id1).first()
         block2 = self.neo4j_graph.nodes.match("Block", block_id=block_id2).first()
-        self.neo4j_graph.create(Relationship(block1, "FOLLOWS", block2))  # Assuming both nodes exist
+        self.neo4j_graph.create(self._py2neo.Relationship(block1, "FOLLOWS", block2))  # Assuming both nodes exist
+        metrics.incr("neo4j.round_trips", 3)  # 2 matches + create
+
+    def store_document(self, filename, structured_data):
+        """Stores a whole analyzed document ({page_number: [blocks]}) and returns its doc_id.
+
+        Blocks of a page are chained with FOLLOWS relationships in reading order.
+        """
+        doc_id = self.create_document(filename)
+        for page_num, page_data in structured_data.items():
+            with metrics.stage("persistence", page=page_num):
+                page_id = self.create_page(doc_id, page_num,  width=None, height=None) # Get width and height from PDF metadata
+                for i, block_data in enumerate(page_data):
+                    block_id = self.create_block(page_id, block_data["type"], x=None, y=None, width=None, height=None, **block_data) # Add layout info if available
+                    if i > 0:
+                        self.create_follows_relationship(prev_block_id, block_id) # Assumes blocks are in order
+                    prev_block_id = block_id # Save previous block ID to create FOLLOWS relationships
+                metrics.incr("blocks.persisted", len(page_data))
+        return doc_id
 
     # ... (Add other methods for creating relationships, querying data, etc.)
 
     def close(self):  # Clean up resources MUST DO
         self.pg_cursor.close()
         self.pg_conn.close()
+
+
+# Example usage of the Neo4j-only helper (kept out of module import: it clears the database!)
+if __name__ == "__main__":
+    import os
+
+    # ... (Get database credentials from configuration)
+    neo4j_persistence = Neo4jPersistence(os.environ.get("NEO4J_URI"), os.environ.get("NEO4J_USERNAME"),
+                                         os.environ.get("NEO4J_PASSWORD"))
+
+    # clear the DB.
+    neo4j_persistence.clear_database()
+
+    # Example: Create a document and a page
+    doc_node = neo4j_persistence.create_document_node(1, "my_document.pdf")
+    page_node = neo4j_persistence.create_page_node(1, 1, 1, 8.5, 11)
+
+    # Example: Create some blocks and a FOLLOWS relationship. text_content is passed as **kwargs in this example
+    block1 = neo4j_persistence.create_block_node(1, 1, "text", 10, 10, 200, 50, text_content="This is the first block.") # Example usage of **kwargs
+    block2 = neo4j_persistence.create_block_node(2, 1, "image", 10, 70, 300, 200)
+
+    neo4j_persistence.create_follows_relationship(1, 2)
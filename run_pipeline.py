@@ -2,54 +2,90 @@
 
 import argparse
 import os
-from pdf_parser import PDFParser
-from structure_analyzer import StructureAnalyzer
-from persistence_layer import PersistenceLayer
-from latex_generator import LaTeXGenerator
+from instrumentation import metrics
+
+# The pipeline modules (and through them pytesseract, PIL, fitz, psycopg2, py2neo and jinja2)
+# are imported inside the stages that need them, to keep CLI start-up fast.
 
 def main():
     parser = argparse.ArgumentParser(description="PDF to LaTeX conversion pipeline.")
     parser.add_argument("input_pdf", help="Path to the input PDF file.")
     parser.add_argument("output_tex", help="Path to the output LaTeX file.")
+    parser.add_argument("--enqueue", action="store_true",
+                        help="Queue the PDF for distributed processing (see run_worker.py) instead of converting it here. "
+                             "Queued documents are kept in the Jobs table only; they are not written to "
+                             "Pages/Blocks or Neo4j.")
+    parser.add_argument("--granularity", choices=["page", "document"], default="page",
+                        help="With --enqueue: queue one job per page or one job for the whole document.")
+    parser.add_argument("--wait", action="store_true",
+                        help="With --enqueue: wait for the workers to finish and write output_tex on this machine.")
+    parser.add_argument("--wait-timeout", type=float, default=3600.0,
+                        help="With --wait: give up after this many seconds (the document stays queued).")
+    parser.add_argument("--no-persist", action="store_true",
+                        help="Skip PostgreSQL/Neo4j and generate LaTeX straight from the analysis results.")
+    parser.add_argument("--template-dir", default="templates", help="Jinja2 template directory for LaTeX generation.")
+    parser.add_argument("--image-dir", default="exported_images", help="Directory for the rasterized page images.")
+    parser.add_argument("--metrics-out", metavar="PATH",
+                        help="Write per-stage and per-page timings, counters and peak memory as JSON to PATH.")
+    parser.add_argument("--profile", metavar="PATH", help="Write a cProfile dump of the run to PATH.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record the Python heap peak with tracemalloc (slows the run down).")
     # Add other command-line arguments as needed (e.g., database credentials, configuration options)
     args = parser.parse_args()
 
-
+    if args.enqueue:
+        enqueue(args)
+        return
+
+    metrics.start(trace_memory=args.trace_memory)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        convert(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)  # Inspect with `python -m pstats` or snakeviz
+        if args.metrics_out:
+            metrics.write_json(args.metrics_out)
+        if args.profile or args.metrics_out:
+            print(metrics.summary())
+
+
+def convert(args, persistence=None):
+    """Runs the four pipeline stages on args.input_pdf and writes args.output_tex.
+
+    `persistence` replaces the PersistenceLayer connected from the environment (the benchmarks pass a stub).
+    """
 
     # 1. PDF Parsing
+    from pdf_parser import PDFParser
     pdf_parser = PDFParser()  # Or initialize with Tesseract path if needed
-    extracted_text = pdf_parser.parse_pdf(args.input_pdf)
+    with metrics.stage("parse_pdf"):
+        extracted_text = pdf_parser.parse_pdf(args.input_pdf, args.image_dir)
 
 
 
 
     # 2. Structure Analysis
+    from structure_analyzer import StructureAnalyzer
     analyzer = StructureAnalyzer()
     structured_data = {}
     for page_num, text in extracted_text.items():
-        structured_data[page_num] = analyzer.analyze_text(text)
+        with metrics.stage("analyze_text", page=page_num):
+            structured_data[page_num] = analyzer.analyze_text(text)
 
 
     # 3. Persistence Layer (Example - adapt to your needs)
-    # Get database credentials from environment variables or a configuration file
-    pg_conn_str = os.environ.get("PG_CONN_STR")  # Or get from config file
-    neo4j_uri = os.environ.get("NEO4J_URI")
-    neo4j_username = os.environ.get("NEO4J_USERNAME")
-    neo4j_password = os.environ.get("NEO4J_PASSWORD")
-
-
-
-    persistence = PersistenceLayer(pg_conn_str, neo4j_uri, neo4j_username, neo4j_password)
-    doc_id = persistence.create_document(os.path.basename(args.input_pdf))
-
-
-    for page_num, page_data in structured_data.items():
-        page_id = persistence.create_page(doc_id, page_num,  width=None, height=None) # Get width and height from PDF metadata
-        for i, block_data in enumerate(page_data):
-            block_id = persistence.create_block(page_id, block_data["type"], x=None, y=None, width=None, height=None, **block_data) # Add layout info if available
-            if i > 0:
-                persistence.create_follows_relationship(prev_block_id, block_id) # Assumes blocks are in order
-            prev_block_id = block_id # Save previous block ID to create FOLLOWS relationships
+    if args.no_persist:
+        persistence = None
+    else:
+        if persistence is None:
+            persistence = connect_persistence()
+        persistence.store_document(os.path.basename(args.input_pdf), structured_data)
 
 
 
@@ -58,16 +94,71 @@ def main():
 
 
     # 4. LaTeX Generation
-    latex_generator = LaTeXGenerator() # Initialize with your template directory if needed
-    latex_code = latex_generator.generate_latex(document_data_for_latex)
+    from latex_generator import LaTeXGenerator
+    latex_generator = LaTeXGenerator(args.template_dir)
+    with metrics.stage("generate_latex"):
+        latex_code = latex_generator.generate_latex(document_data_for_latex)
 
     with open(args.output_tex, "w") as tex_file:
         tex_file.write(latex_code)
 
 
-    persistence.close() #  Important: close connections when done!
+    if persistence:
+        persistence.close() #  Important: close connections when done!
+
 
+def connect_persistence():
+    """Connects a PersistenceLayer using the credentials in the environment."""
+    from persistence_layer import PersistenceLayer
+
+    # Get database credentials from environment variables or a configuration file
+    pg_conn_str = os.environ.get("PG_CONN_STR")  # Or get from config file
+    neo4j_uri = os.environ.get("NEO4J_URI")
+    neo4j_username = os.environ.get("NEO4J_USERNAME")
+    neo4j_password = os.environ.get("NEO4J_PASSWORD")
 
+    with metrics.stage("persistence.connect"):
+        return PersistenceLayer(pg_conn_str, neo4j_uri, neo4j_username, neo4j_password)
+
+
+def enqueue(args):
+    """Stores the PDF in PostgreSQL and queues its jobs; workers on any node pick them up."""
+    from pdf_parser import PDFParser
+    from job_queue import JobQueue
+
+    with open(args.input_pdf, "rb") as pdf_file:
+        source_pdf = pdf_file.read()
+
+    queue = JobQueue(os.environ.get("PG_CONN_STR"))
+    doc_id = queue.enqueue_document(os.path.basename(args.input_pdf), source_pdf,
+                                    PDFParser().page_count(source_pdf), granularity=args.granularity)
+    print(f"Queued document {doc_id}: {queue.document_status(doc_id)}")
+    if args.wait:
+        wait_for_output(queue, doc_id, args.output_tex, timeout=args.wait_timeout)
+    else:
+        print(f"The LaTeX will be stored in Jobs.result of document {doc_id}'s finalize job; "
+              "use --wait to have it written to output_tex.")
+    queue.close()
+
+
+def wait_for_output(queue, doc_id, output_tex, timeout=3600.0, poll_interval=2.0):
+    """Polls until the document's finalize job has run, then writes its LaTeX to output_tex.
+
+    Exits after `timeout` seconds if the document is still unfinished (e.g. no worker is running).
+    """
+    import time
+
+    deadline = time.monotonic() + timeout
+    status, result = queue.get_finalize_result(doc_id)
+    while status not in ("done", "failed"):
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Document {doc_id} did not finish within {timeout:.0f}s: {queue.document_status(doc_id)}")
+        time.sleep(poll_interval)
+        status, result = queue.get_finalize_result(doc_id)
+    if status == "failed":
+        raise SystemExit(f"Document {doc_id} failed: {queue.document_status(doc_id)}")
+    with open(output_tex, "w") as tex_file:
+        tex_file.write(result["latex"])
 
 
 if __name__ == "__main__":
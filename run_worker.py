@@ -0,0 +1,63 @@
+# run_worker.py
+
+import argparse
+import multiprocessing
+import os
+import socket
+
+from job_queue import Worker
+
+
+def _worker_main(args, index):
+    worker_id = f"{args.worker_id or socket.gethostname()}:{os.getpid()}:{index}"
+    worker = Worker(args.pg_conn_str, worker_id=worker_id, lease_seconds=args.lease_seconds,
+                    poll_interval=args.poll_interval, tesseract_path=args.tesseract_path,
+                    template_dir=args.template_dir, metrics_out=_metrics_path(args, index),
+                    metrics_interval=args.metrics_interval)
+    try:
+        processed = worker.run(max_jobs=args.max_jobs, exit_when_idle=args.exit_when_idle)
+        print(f"[{worker_id}] Processed {processed} job(s).")
+    finally:
+        worker.close()
+
+
+def _metrics_path(args, index):
+    """Each local worker process appends to its own file: metrics.jsonl -> metrics.0.jsonl, metrics.1.jsonl, ..."""
+    if not args.metrics_out or args.processes == 1:
+        return args.metrics_out
+    root, ext = os.path.splitext(args.metrics_out)
+    return f"{root}.{index}{ext}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker for the distributed PDF to LaTeX job queue.")
+    parser.add_argument("--pg-conn-str", default=os.environ.get("PG_CONN_STR"),
+                        help="PostgreSQL connection string (defaults to $PG_CONN_STR).")
+    parser.add_argument("--processes", type=int, default=1, help="Number of local worker processes to start.")
+    parser.add_argument("--worker-id", help="Prefix for worker ids (defaults to the host name).")
+    parser.add_argument("--lease-seconds", type=int, default=60,
+                        help="Lease length; a job whose worker stops heart-beating is reclaimed after this.")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds to wait when the queue is empty.")
+    parser.add_argument("--max-jobs", type=int, help="Stop each worker after this many jobs.")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Stop once no job is runnable.")
+    parser.add_argument("--metrics-out", metavar="PATH",
+                        help="Append a JSON line of stage timings, counters and cache hit rates to PATH "
+                             "every --metrics-interval seconds (one file per process with --processes).")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, help="Seconds between metrics flushes.")
+    parser.add_argument("--tesseract-path", help="Path to the Tesseract executable.")
+    parser.add_argument("--template-dir", default="templates", help="Jinja2 template directory for the finalizer.")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _worker_main(args, 0)
+        return
+
+    processes = [multiprocessing.Process(target=_worker_main, args=(args, i)) for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# tests/test_job_queue.py
+#
+# Runs the job queue with several worker processes against a real PostgreSQL database.
+# Skipped unless PG_CONN_STR is set; the test works in a scratch schema that it drops afterwards.
+
+import multiprocessing
+import os
+import time
+import uuid
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+from psycopg2.extensions import make_dsn
+
+from job_queue import JobQueue, Worker
+from run_pipeline import wait_for_output
+
+pytestmark = pytest.mark.skipif(not os.environ.get("PG_CONN_STR"), reason="PG_CONN_STR is not set")
+
+SCHEMA_FILE = os.path.join(os.path.dirname(__file__), os.pardir, "database_schemas", "postgresql_schema.sql")
+LEASE_SECONDS = 2
+PAGES = 6
+TIMEOUT = 60
+
+
+class RecordingQueue(JobQueue):
+    """Logs every successful complete() so the test can check that no job was completed twice."""
+
+    def complete(self, job_id, worker_id, result):
+        completed = super().complete(job_id, worker_id, result)
+        if completed:
+            self._pg_execute("INSERT INTO TestCompletions (job_id, worker_id) VALUES (%s, %s);", (job_id, worker_id))
+        return completed
+
+
+class FakeWorker(Worker):
+    """A Worker whose page and finalize jobs need no OCR, PyMuPDF or templates."""
+
+    queue_class = RecordingQueue
+
+    def __init__(self, pg_conn_str, worker_id, failing_doc_id, stall):
+        super().__init__(pg_conn_str, worker_id=worker_id, lease_seconds=LEASE_SECONDS, poll_interval=0.1)
+        self.failing_doc_id = failing_doc_id
+        self.stall = stall
+
+    def _run_page_job(self, job):
+        if job["doc_id"] == self.failing_doc_id:
+            raise RuntimeError("this document always fails")
+        if self.stall:
+            time.sleep(600)  # Holds the lease (heart-beating) until the test kills this process
+        time.sleep(0.05)
+        return [{"type": "paragraph", "content": f"Page {job['page_number']}"}]
+
+    def _run_finalize_job(self, job):
+        unfinished = self.queue._pg_execute(
+            "SELECT count(*) FROM Jobs WHERE doc_id = %s AND job_type <> 'finalize' AND status <> 'done';",
+            (job["doc_id"],), fetch="one",
+        )[0]
+        return {"unfinished_dependencies": unfinished, "pages": list(self.queue.get_document_results(job["doc_id"]))}
+
+
+def _run_worker(pg_conn_str, worker_id, failing_doc_id, stall=False):
+    FakeWorker(pg_conn_str, worker_id, failing_doc_id, stall).run()
+
+
+@pytest.fixture
+def pg_conn_str():
+    """A connection string whose search_path points at a fresh schema holding the PostgreSQL tables."""
+    schema = f"test_job_queue_{uuid.uuid4().hex[:8]}"
+    with open(SCHEMA_FILE) as f:
+        ddl = f.read().split("-- Neo4j Schema")[0]
+
+    conn = psycopg2.connect(os.environ["PG_CONN_STR"])
+    conn.autocommit = True
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE SCHEMA {schema};")
+    cursor.execute(f"SET search_path TO {schema};")
+    cursor.execute(ddl)
+    cursor.execute("CREATE TABLE TestCompletions (job_id INTEGER, worker_id TEXT);")
+    try:
+        yield make_dsn(os.environ["PG_CONN_STR"], options=f"-c search_path={schema}", application_name=schema)
+    finally:
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE;")
+        conn.close()
+
+
+def _query(queue, query, params=None):
+    return queue._pg_execute(query, params, fetch="all")
+
+
+def _drop_connections(pg_conn_str):
+    """Terminates every connection of this test (the fixture tags them with its schema name)."""
+    admin = psycopg2.connect(os.environ["PG_CONN_STR"])
+    admin.autocommit = True
+    admin.cursor().execute(
+        "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE application_name = %s;",
+        (dict(p.split("=", 1) for p in pg_conn_str.split())["application_name"],),
+    )
+    admin.close()
+
+
+def _wait_for(predicate, what):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail(f"Timed out waiting for {what}")
+        time.sleep(0.1)
+
+
+def test_workers_process_reclaim_and_finalize(pg_conn_str):
+    queue = JobQueue(pg_conn_str)
+    doc_id = queue.enqueue_document("pages.pdf", b"%PDF-1.4 stub", PAGES)
+    failing_doc_id = queue.enqueue_document("broken.pdf", b"%PDF-1.4 stub", 2, max_attempts=2)
+
+    def finalize_status(doc):
+        return queue.get_finalize_result(doc)[0]
+
+    context = multiprocessing.get_context("spawn")
+    # The stalling worker starts alone, so it is guaranteed to lease the first page of doc_id
+    staller = context.Process(target=_run_worker, args=(pg_conn_str, "staller", failing_doc_id, True))
+    staller.start()
+    workers = []
+    try:
+        _wait_for(lambda: _query(queue, "SELECT 1 FROM Jobs WHERE leased_by = 'staller' AND status = 'leased';"),
+                  "the stalling worker to take a lease")
+        stalled_job_id = _query(queue, "SELECT job_id FROM Jobs WHERE leased_by = 'staller';")[0][0]
+        staller.kill()  # Dies holding the lease; its heartbeats stop with it
+        staller.join()
+
+        workers = [context.Process(target=_run_worker, args=(pg_conn_str, f"worker-{i}", failing_doc_id))
+                   for i in range(3)]
+        for worker in workers:
+            worker.start()
+        _wait_for(lambda: finalize_status(doc_id) == "done" and finalize_status(failing_doc_id) == "failed",
+                  "both documents to settle")
+    finally:
+        for process in [staller] + workers:
+            process.kill()
+            process.join()
+
+    # Every page is done, and was completed exactly once
+    pages = _query(queue, "SELECT job_id, status FROM Jobs WHERE doc_id = %s AND job_type = 'page';", (doc_id,))
+    assert len(pages) == PAGES
+    assert all(status == "done" for _, status in pages)
+    completions = dict(_query(queue, "SELECT job_id, count(*) FROM TestCompletions GROUP BY job_id;"))
+    assert all(completions.get(job_id) == 1 for job_id, _ in pages)
+
+    # The stalled page was reclaimed after its lease expired and finished by another worker
+    leased_by, attempts = _query(queue, "SELECT leased_by, attempts FROM Jobs WHERE job_id = %s;", (stalled_job_id,))[0]
+    assert leased_by != "staller"
+    assert attempts == 2
+
+    # The finalizer ran once, after every page was done, and saw all of them
+    status, result = queue.get_finalize_result(doc_id)
+    assert result == {"unfinished_dependencies": 0, "pages": list(range(1, PAGES + 1))}
+
+    # The always-failing document used up its attempts, and its finalize job never ran
+    failed = _query(queue, "SELECT job_type, status, attempts FROM Jobs WHERE doc_id = %s;", (failing_doc_id,))
+    assert sorted(failed) == [("finalize", "failed", 0), ("page", "failed", 2), ("page", "failed", 2)]
+
+    queue.close()
+
+
+def test_worker_survives_a_dropped_connection(pg_conn_str):
+    queue = JobQueue(pg_conn_str)
+    context = multiprocessing.get_context("spawn")
+    worker = context.Process(target=_run_worker, args=(pg_conn_str, "worker", None))
+    worker.start()
+    try:
+        first_doc = queue.enqueue_document("first.pdf", b"%PDF-1.4 stub", 2)
+        _wait_for(lambda: queue.get_finalize_result(first_doc)[0] == "done", "the first document")
+
+        _drop_connections(pg_conn_str)
+        queue.close()
+
+        queue = JobQueue(pg_conn_str)
+        second_doc = queue.enqueue_document("second.pdf", b"%PDF-1.4 stub", 2)
+        _wait_for(lambda: queue.get_finalize_result(second_doc)[0] == "done", "the worker to reconnect")
+        assert worker.is_alive()
+    finally:
+        worker.kill()
+        worker.join()
+        queue.close()
+
+
+def test_failure_settles_the_document_despite_a_dropped_connection(pg_conn_str, tmp_path):
+    output_tex = str(tmp_path / "output.tex")
+    queue = JobQueue(pg_conn_str)
+    doc_id = queue.enqueue_document("broken.pdf", b"%PDF-1.4 stub", 2, max_attempts=1)
+    job = queue.claim("worker", LEASE_SECONDS)
+    queue.fail(job["job_id"], "worker", RuntimeError("no retries left"))
+    _drop_connections(pg_conn_str)  # The worker dies right after failing the job
+
+    queue = JobQueue(pg_conn_str)
+    assert queue.get_finalize_result(doc_id)[0] == "failed"
+    with pytest.raises(SystemExit, match="failed"):
+        wait_for_output(queue, doc_id, output_tex, timeout=TIMEOUT, poll_interval=0.1)
+
+    # A finalize job left pending behind a failed page (a failure recorded in two steps, cut off
+    # in between) is failed by the next reap instead of blocking --wait forever
+    orphan_doc_id = queue.enqueue_document("orphan.pdf", b"%PDF-1.4 stub", 2)
+    queue._pg_execute("UPDATE Jobs SET status = 'failed' WHERE doc_id = %s AND page_number = 1;", (orphan_doc_id,))
+    queue.reap_expired()
+    assert queue.get_finalize_result(orphan_doc_id)[0] == "failed"
+
+    # With no worker running, --wait gives up instead of polling forever
+    pending_doc_id = queue.enqueue_document("pending.pdf", b"%PDF-1.4 stub", 1)
+    with pytest.raises(SystemExit, match="did not finish"):
+        wait_for_output(queue, pending_doc_id, output_tex, timeout=0.3, poll_interval=0.1)
+    assert not os.path.exists(output_tex)
+    queue.close()
+
+
+class LeaseStealingWorker(FakeWorker):
+    """Has its lease taken away mid-job, then works until the heartbeat notices."""
+
+    def _run_page_job(self, job):
+        thief = JobQueue(self.pg_conn_str)
+        thief._pg_execute("UPDATE Jobs SET leased_by = 'thief' WHERE job_id = %s;", (job["job_id"],))
+        thief.close()
+        deadline = time.monotonic() + TIMEOUT
+        while time.monotonic() < deadline:
+            self._check_lease()
+            time.sleep(0.05)
+        raise RuntimeError("the heartbeat never noticed the lost lease")
+
+
+def test_worker_abandons_a_job_whose_lease_was_lost(pg_conn_str):
+    queue = JobQueue(pg_conn_str)
+    doc_id = queue.enqueue_document("stolen.pdf", b"%PDF-1.4 stub", 1)
+    worker = LeaseStealingWorker(pg_conn_str, "worker", None, stall=False)
+    assert worker.run(max_jobs=1) == 1
+    worker.close()
+
+    # The job was neither completed nor failed by the worker that lost it
+    rows = _query(queue, "SELECT leased_by, status, error FROM Jobs WHERE doc_id = %s AND job_type = 'page';",
+                  (doc_id,))
+    assert rows == [("thief", "leased", None)]
+    assert _query(queue, "SELECT count(*) FROM TestCompletions;") == [(0,)]
+    queue.close()